@@ -0,0 +1,69 @@
+"""
+NOMAD Survival Library - Multi-keyword matcher
+Small pure-Python Aho-Corasick automaton so each document is scanned
+once for every keyword list instead of once per keyword.
+Mirrors the add_word / make_automaton / iter API of pyahocorasick.
+"""
+
+
+class Automaton:
+    """Aho-Corasick automaton over lowercase keyword strings."""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._values = [[]]
+        self._delta = None
+        self._out = None
+
+    def add_word(self, word, value):
+        """Add a keyword. Adding the same word twice keeps both values."""
+        if self._delta is not None:
+            raise RuntimeError("Automaton already built")
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._values.append([])
+                self._goto[state][ch] = nxt
+            state = nxt
+        self._values[state].append(value)
+
+    def make_automaton(self):
+        """Resolve failure links into a full transition table (DFA)."""
+        goto = self._goto
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        out = [None] * len(goto)
+
+        delta[0] = dict(goto[0])
+        out[0] = tuple(self._values[0])
+        queue = list(goto[0].values())
+        for state in queue:
+            fail[state] = 0
+
+        # Breadth-first, so every fail target is resolved before it is used
+        for state in queue:
+            f = fail[state]
+            delta[state] = {**delta[f], **goto[state]}
+            out[state] = tuple(self._values[state]) + out[f]
+            for ch, child in goto[state].items():
+                fail[child] = delta[f].get(ch, 0)
+                queue.append(child)
+
+        self._delta = delta
+        self._out = out
+
+    def iter(self, text):
+        """Yield (end_index, value) for every keyword occurrence in text."""
+        if self._delta is None:
+            raise RuntimeError("Call make_automaton() first")
+        delta = self._delta
+        out = self._out
+        state = 0
+        for i, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                for value in out[state]:
+                    yield i, value
@@ -0,0 +1,43 @@
+"""
+NOMAD Survival Library - Catalog JSON I/O and stats
+Shared writer for catalog.json and the download manifests,
+plus the one-record-per-line encoder for JSONL progress files.
+Uses orjson (C encoder) when installed; falls back to the stdlib json module.
+Both produce byte-identical, 2-space indented UTF-8 output.
+"""
+
+import json
+from collections import Counter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def write_json(path, data):
+    """Write data to path, same output as json.dump(indent=2, ensure_ascii=False)."""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def json_line(data):
+    """Encode data as one compact, newline-terminated UTF-8 JSON line (bytes)."""
+    if orjson is not None:
+        return orjson.dumps(data) + b"\n"
+    return (json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def catalog_stats(items):
+    """Tally catalog items by category and tier, plus total size.
+    Returns (category_counts, tier_counts, total_size_bytes)."""
+    category_counts = Counter(item["category"] for item in items)
+    tier_counts = Counter({"essential": 0, "standard": 0, "comprehensive": 0})
+    tier_counts.update(item["tier"] for item in items)
+    total_size = sum(item["size_bytes"] for item in items)
+    # Plain dicts keep printed stats and JSON identical to before
+    return dict(category_counts), dict(tier_counts), total_size
@@ -10,13 +10,28 @@ import json
 import re
 from pathlib import Path
 from datetime import datetime
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# Add scripts dir to path for import
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from aho_corasick import Automaton
+from catalog_io import catalog_stats, write_json
 
 BASE_DIR = Path(__file__).parent.parent
 DOWNLOAD_DIR = BASE_DIR / "pdfs" / "_downloads"
 MANIFEST_FILE = BASE_DIR / "catalog" / "download_manifest.json"
 CATALOG_FILE = BASE_DIR / "catalog" / "catalog.json"
 
+# Catalog ids are lowercase filenames without ".pdf", spaces as dashes
+SPACE_TO_DASH = str.maketrans(" ", "-")
+
+# Below this many manifest items, process startup costs more than it saves
+PARALLEL_MIN_ITEMS = 2000
+
 # Category definitions with keyword matching
+# Keywords are substring matches, so stems like "snare", "dehydrat" and "woods"
+# also hit "Snares", "Dehydrating" and "Woodsmanship".
 CATEGORY_RULES = {
     "survival": {
         "keywords": ["survival manual", "survival guide", "survival skills", "wilderness survival",
@@ -135,6 +150,9 @@ STANDARD_KEYWORDS = [
     "checklist", "knots", "deadfalls", "signals", "direction finding"
 ]
 
+# Catalog sort order within a category
+TIER_ORDER = {"essential": 0, "standard": 1, "comprehensive": 2}
+
 # Low relevance items
 LOW_RELEVANCE_KEYWORDS = [
     "burning man", "dog bug out", "gift mix", "baby food",
@@ -162,97 +180,150 @@ POLITICAL_EXCLUSION_KEYWORDS = [
 ]
 
 
-def check_political_content(title, filename):
-    """Check if a PDF title/filename indicates overtly political content.
-    Returns the matched keyword if political, or None if clean."""
-    combined = (title + " " + filename).lower()
-    for keyword in POLITICAL_EXCLUSION_KEYWORDS:
-        if keyword in combined:
-            return keyword
-    return None
-
-
-def categorize_pdf(title, filename):
-    """Assign the best category based on title keywords."""
-    title_lower = title.lower()
-    filename_lower = filename.lower()
-    combined = title_lower + " " + filename_lower
-
-    best_category = "education"  # default fallback
-    best_priority = 999
-    best_match_count = 0
-
-    for cat_id, cat_info in CATEGORY_RULES.items():
-        match_count = 0
-        for keyword in cat_info["keywords"]:
-            if keyword.lower() in combined:
-                match_count += 1
-
-        if match_count > 0:
-            # Prefer categories with more keyword matches, then by priority
-            if match_count > best_match_count or (match_count == best_match_count and cat_info["priority"] < best_priority):
-                best_category = cat_id
-                best_priority = cat_info["priority"]
-                best_match_count = match_count
-
-    return best_category
-
-
-def score_pdf(title, filename, size_bytes):
-    """Score PDF as Essential/Standard/Comprehensive."""
-    combined = (title + " " + filename).lower()
-    size_mb = size_bytes / (1024 * 1024)
-
-    # Check for Essential
-    for keyword in ESSENTIAL_KEYWORDS:
-        if keyword in combined:
-            return "essential"
-
-    # Check for Standard
-    for keyword in STANDARD_KEYWORDS:
-        if keyword in combined:
-            return "standard"
-
-    # Large files tend to be comprehensive reference volumes
-    if size_mb > 20:
-        return "comprehensive"
-
-    # Default to standard
-    return "standard"
-
-
-def check_relevance(title):
-    """Check if a PDF has low relevance to serious survival scenarios."""
-    title_lower = title.lower()
-    for keyword in LOW_RELEVANCE_KEYWORDS:
-        if keyword in title_lower:
-            return "low"
-    return "high"
+def _build_keyword_buckets():
+    """Map each unique lowercased keyword to every bucket it belongs to.
+    Buckets are category ids plus ESSENTIAL, STANDARD, LOW and POLITICAL."""
+    keyword_lists = [(cat_id, cat_info["keywords"]) for cat_id, cat_info in CATEGORY_RULES.items()]
+    keyword_lists += [("ESSENTIAL", ESSENTIAL_KEYWORDS),
+                      ("STANDARD", STANDARD_KEYWORDS),
+                      ("LOW", LOW_RELEVANCE_KEYWORDS),
+                      ("POLITICAL", POLITICAL_EXCLUSION_KEYWORDS)]
+    keyword_buckets = {}
+    for bucket, keywords in keyword_lists:
+        for keyword in keywords:
+            buckets = keyword_buckets.setdefault(keyword.lower(), [])
+            if bucket not in buckets:
+                buckets.append(bucket)
+    return {keyword: tuple(buckets) for keyword, buckets in keyword_buckets.items()}
+
+
+KEYWORD_BUCKETS = _build_keyword_buckets()
+
+
+def _build_automaton():
+    """Index every unique keyword once; a hit carries all of its buckets."""
+    # Not a regex alternation per list: re.findall skips overlapping hits
+    # ("nuclear" inside "nuclear war") and counts a keyword again when the
+    # filename repeats the title, which changes category counts.
+    automaton = Automaton()
+    for keyword, buckets in KEYWORD_BUCKETS.items():
+        automaton.add_word(keyword, (keyword, buckets))
+    automaton.make_automaton()
+    return automaton
+
+
+KEYWORD_AUTOMATON = _build_automaton()
+
+# Stable sort, so equal priorities keep their CATEGORY_RULES order
+CATEGORIES_BY_PRIORITY = sorted(CATEGORY_RULES, key=lambda c: CATEGORY_RULES[c]["priority"])
+
+
+# Result of classify(). excluded_by is the political keyword that excluded
+# the PDF (other fields are then None), or None if the PDF is clean.
+Classification = namedtuple("Classification", ["excluded_by", "category", "tier", "relevance"],
+                            defaults=(None, None, None))
+
+
+def classify(title_lower, filename_lower, size_bytes):
+    """Classify a PDF in a single keyword pass over its title and filename.
+    Expects both strings already lowercased by the caller.
+    Returns a Classification; the scan stops at the first political match."""
+    hits = {}
+    low_in_title = False
+    # Title and filename are scanned separately; no keyword spans the join
+    for in_title, text in ((True, title_lower), (False, filename_lower)):
+        for _, (keyword, buckets) in KEYWORD_AUTOMATON.iter(text):
+            # Political/conspiracy content filter — nothing else matters once hit
+            if "POLITICAL" in buckets:
+                return Classification(excluded_by=keyword)
+            for bucket in buckets:
+                hits.setdefault(bucket, set()).add(keyword)
+            # Relevance only looks at the title, not the filename
+            if in_title and "LOW" in buckets:
+                low_in_title = True
+
+    # Category: prefer more distinct keyword matches, then by priority
+    category = "education"  # default fallback
+    match_counts = {cat_id: len(hits[cat_id]) for cat_id in CATEGORY_RULES if cat_id in hits}
+    if match_counts:
+        best_match_count = max(match_counts.values())
+        for cat_id in CATEGORIES_BY_PRIORITY:
+            if match_counts.get(cat_id) == best_match_count:
+                category = cat_id
+                break
+
+    # Tier: Essential, then Standard, then large files are comprehensive
+    if "ESSENTIAL" in hits:
+        tier = "essential"
+    elif "STANDARD" in hits:
+        tier = "standard"
+    elif size_bytes / (1024 * 1024) > 20:
+        tier = "comprehensive"
+    else:
+        tier = "standard"
+
+    relevance = "low" if low_in_title else "high"
+    return Classification(None, category, tier, relevance)
+
+
+# Category ID -> phrase used in generated summaries
+CATEGORY_SUMMARY_NAMES = {
+    "survival": "survival",
+    "medicine": "medical and first aid",
+    "preparedness": "emergency preparedness",
+    "military": "military field operations",
+    "nuclear-cbrn": "nuclear/CBRN preparedness",
+    "food-agriculture": "food procurement and preservation",
+    "diy-repair": "DIY construction and repair",
+    "navigation": "navigation and communication",
+    "self-defense": "self-defense and security",
+    "shelter-construction": "shelter construction",
+    "water-sanitation": "water and sanitation",
+    "reference": "quick reference",
+    "education": "general education",
+    "computing-technology": "computing and technology"
+}
 
 
 def generate_summary_from_title(title, category, score):
     """Generate a basic summary from the title and metadata.
     A more thorough summary would require reading the PDF content."""
-    cat_names = {
-        "survival": "survival",
-        "medicine": "medical and first aid",
-        "preparedness": "emergency preparedness",
-        "military": "military field operations",
-        "nuclear-cbrn": "nuclear/CBRN preparedness",
-        "food-agriculture": "food procurement and preservation",
-        "diy-repair": "DIY construction and repair",
-        "navigation": "navigation and communication",
-        "self-defense": "self-defense and security",
-        "shelter-construction": "shelter construction",
-        "water-sanitation": "water and sanitation",
-        "reference": "quick reference",
-        "education": "general education",
-        "computing-technology": "computing and technology"
-    }
-    cat_desc = cat_names.get(category, "general reference")
+    cat_desc = CATEGORY_SUMMARY_NAMES.get(category, "general reference")
     return f"{title}. A {cat_desc} resource classified as {score} for offline survival library use."
 
 
+def classify_item(item):
+    """Build the catalog entry for one manifest item.
+    Returns (catalog_item, None), or (None, keyword) if excluded as political."""
+    title = item["title"]
+    filename = item["filename"]
+    size_bytes = item["size_bytes"]
+
+    result = classify(title.lower(), filename.lower(), size_bytes)
+    if result.excluded_by:
+        return None, result.excluded_by
+    category, score, relevance = result.category, result.tier, result.relevance
+
+    # Summary
+    summary = generate_summary_from_title(title, category, score)
+
+    catalog_item = {
+        "id": (filename[:-4] if filename.endswith(".pdf") else filename).lower().translate(SPACE_TO_DASH),
+        "title": title,
+        "filename": filename,
+        "category": category,
+        "tier": score,
+        "relevance": relevance,
+        "summary": summary,
+        "size_bytes": size_bytes,
+        "size_mb": round(size_bytes / (1024 * 1024), 2),
+        "sha256": item["sha256"],
+        "source": item["source"],
+        "original_url": item["original_url"]
+    }
+    return catalog_item, None
+
+
 def main():
     # Load manifest
     with open(MANIFEST_FILE) as f:
@@ -264,59 +335,38 @@ def main():
 
     print(f"Processing {len(manifest['items'])} downloaded PDFs...")
 
-    catalog_items = []
-    category_counts = {}
-    tier_counts = {"essential": 0, "standard": 0, "comprehensive": 0}
+    items_by_category = defaultdict(list)
     excluded_political = []
 
-    for item in manifest["items"]:
-        title = item["title"]
-        filename = item["filename"]
-        size_bytes = item["size_bytes"]
+    items = manifest["items"]
+    if len(items) >= PARALLEL_MIN_ITEMS:
+        with ProcessPoolExecutor() as executor:
+            results = list(executor.map(classify_item, items, chunksize=64))
+    else:
+        results = map(classify_item, items)
 
+    for item, (catalog_item, political_match) in zip(items, results):
         # Political content filter — skip overtly political/conspiracy material
-        political_match = check_political_content(title, filename)
         if political_match:
-            excluded_political.append((title, political_match))
-            print(f"  [EXCLUDED - POLITICAL] {title} (matched: \"{political_match}\")")
+            excluded_political.append((item["title"], political_match))
+            print(f"  [EXCLUDED - POLITICAL] {item['title']} (matched: \"{political_match}\")")
             continue
 
-        # Categorize
-        category = categorize_pdf(title, filename)
-        category_counts[category] = category_counts.get(category, 0) + 1
-
-        # Score
-        score = score_pdf(title, filename, size_bytes)
-        tier_counts[score] += 1
-
-        # Relevance
-        relevance = check_relevance(title)
+        items_by_category[catalog_item["category"]].append(catalog_item)
 
-        # Summary
-        summary = generate_summary_from_title(title, category, score)
+        print(f"  [{catalog_item['category']:>20}] [{catalog_item['tier']:>13}] "
+              f"[{catalog_item['relevance']:>4}] {catalog_item['title']}")
 
-        catalog_item = {
-            "id": filename.replace(".pdf", "").lower().replace(" ", "-"),
-            "title": title,
-            "filename": filename,
-            "category": category,
-            "tier": score,
-            "relevance": relevance,
-            "summary": summary,
-            "size_bytes": size_bytes,
-            "size_mb": round(size_bytes / (1024 * 1024), 2),
-            "sha256": item["sha256"],
-            "source": item["source"],
-            "original_url": item["original_url"]
-        }
-
-        catalog_items.append(catalog_item)
-
-        print(f"  [{category:>20}] [{score:>13}] [{relevance:>4}] {title}")
+    # Sort items by category, then by tier priority, then by title.
+    # Items are already bucketed by category, so only each bucket is sorted.
+    catalog_items = []
+    for category in sorted(items_by_category):
+        bucket = items_by_category[category]
+        bucket.sort(key=lambda x: (TIER_ORDER.get(x["tier"], 1), x["title"]))
+        catalog_items.extend(bucket)
 
-    # Sort items by category, then by tier priority, then by title
-    tier_order = {"essential": 0, "standard": 1, "comprehensive": 2}
-    catalog_items.sort(key=lambda x: (x["category"], tier_order.get(x["tier"], 1), x["title"]))
+    # Calculate stats
+    category_counts, tier_counts, total_size = catalog_stats(catalog_items)
 
     # Update catalog
     catalog["generated"] = datetime.now().isoformat()
@@ -325,13 +375,10 @@ def main():
     catalog["stats"]["tiers"] = tier_counts
     catalog["items"] = catalog_items
 
-    # Calculate total size
-    total_size = sum(item["size_bytes"] for item in catalog_items)
     catalog["stats"]["total_size_mb"] = round(total_size / (1024 * 1024), 2)
 
     # Save catalog
-    with open(CATALOG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(catalog, f, indent=2, ensure_ascii=False)
+    write_json(CATALOG_FILE, catalog)
 
     print(f"\n{'='*60}")
     print(f"CATALOGING COMPLETE")
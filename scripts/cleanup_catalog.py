@@ -1,9 +1,15 @@
 """Clean up catalog - remove entries for files that don't exist (deduped).
 Also updates README.md stats to match current catalog."""
 import json
+import os
 import re
+import sys
 from pathlib import Path
 
+# Add scripts dir to path for import
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from catalog_io import catalog_stats, write_json
+
 # Category ID -> display name mapping
 CATEGORY_NAMES = {
     "diy-repair": "DIY & Repair",
@@ -35,25 +41,40 @@ CATEGORY_DESCRIPTIONS = {
     "water-sanitation": "Water purification, hygiene, sanitation",
 }
 
+# README sections rewritten by update_readme()
+STATS_TABLE_RE = re.compile(r"\| Metric \| Value \|.*?\| Categories \| \d+ \|", re.DOTALL)
+CATEGORY_TABLE_RE = re.compile(r"\| Category \| Count \| Description \|.*?(?=\n\n)", re.DOTALL)
+
+
+def list_existing_files(root):
+    """Return the set of file paths under root, e.g. "pdfs/survival/x.pdf".
+    One directory walk replaces a stat() per catalog entry."""
+    existing = set()
+    for dirpath, _, filenames in os.walk(root):
+        rel = Path(dirpath).as_posix()
+        for name in filenames:
+            existing.add(f"{rel}/{name}")
+    return existing
+
 
 def cleanup_catalog():
     """Remove catalog entries for missing files and recalculate stats."""
     with open("catalog/catalog.json") as f:
         catalog = json.load(f)
 
-    pdfs_dir = Path("pdfs")
+    existing = list_existing_files("pdfs")
     clean = []
     removed = []
 
     for item in catalog["items"]:
         path = item.get("path", "")
-        if path and Path(path).exists():
+        if path and path.replace("\\", "/") in existing:
             clean.append(item)
         else:
             # Try to find it
-            cat_path = pdfs_dir / item["category"] / item["filename"]
-            if cat_path.exists():
-                item["path"] = str(cat_path).replace("\\", "/")
+            cat_path = f"pdfs/{item['category']}/{item['filename']}"
+            if cat_path in existing:
+                item["path"] = cat_path
                 clean.append(item)
             else:
                 removed.append(item["title"])
@@ -66,21 +87,15 @@ def cleanup_catalog():
         print("No missing files found.")
 
     # Recalculate stats
-    cc = {}
-    tc = {"essential": 0, "standard": 0, "comprehensive": 0}
-    for item in clean:
-        cc[item["category"]] = cc.get(item["category"], 0) + 1
-        tc[item["tier"]] = tc.get(item["tier"], 0) + 1
+    cc, tc, ts = catalog_stats(clean)
 
     catalog["items"] = clean
     catalog["stats"]["total_pdfs"] = len(clean)
     catalog["stats"]["categories"] = cc
     catalog["stats"]["tiers"] = tc
-    ts = sum(i["size_bytes"] for i in clean)
     catalog["stats"]["total_size_mb"] = round(ts / (1024 * 1024), 2)
 
-    with open("catalog/catalog.json", "w", encoding="utf-8") as f:
-        json.dump(catalog, f, indent=2, ensure_ascii=False)
+    write_json("catalog/catalog.json", catalog)
 
     print(f"\nFinal catalog: {len(clean)} PDFs, {catalog['stats']['total_size_mb']} MB")
     print(f"Tiers: {tc}")
@@ -111,12 +126,7 @@ def update_readme(stats, category_counts, tier_counts):
         f"| Comprehensive Tier | {tier_counts['comprehensive']} |\n"
         f"| Categories | {len(category_counts)} |"
     )
-    readme = re.sub(
-        r"\| Metric \| Value \|.*?\| Categories \| \d+ \|",
-        stats_table,
-        readme,
-        flags=re.DOTALL,
-    )
+    readme = STATS_TABLE_RE.sub(lambda m: stats_table, readme)
 
     # 2. Update Categories table (sorted by count descending)
     sorted_cats = sorted(category_counts.items(), key=lambda x: -x[1])
@@ -127,17 +137,16 @@ def update_readme(stats, category_counts, tier_counts):
         cat_rows.append(f"| {name} | {count} | {desc} |")
     cat_table = "\n".join(cat_rows)
 
-    readme = re.sub(
-        r"\| Category \| Count \| Description \|.*?(?=\n\n)",
-        cat_table,
-        readme,
-        flags=re.DOTALL,
-    )
+    readme = CATEGORY_TABLE_RE.sub(lambda m: cat_table, readme)
 
-    # 3. Update directory tree PDF counts
-    for cat_id, count in category_counts.items():
-        pattern = rf"(│   [├└]── {re.escape(cat_id)}/)(\s+# )\d+( PDFs?)"
-        readme = re.sub(pattern, rf"\g<1>\g<2>{count}\3", readme)
+    # 3. Update directory tree PDF counts (all categories in one pass)
+    if category_counts:
+        cat_alternation = "|".join(map(re.escape, category_counts))
+        tree_re = re.compile(rf"(│   [├└]── ({cat_alternation})/)(\s+# )\d+( PDFs?)")
+        readme = tree_re.sub(
+            lambda m: f"{m.group(1)}{m.group(3)}{category_counts[m.group(2)]}{m.group(4)}",
+            readme,
+        )
 
     readme_path.write_text(readme, encoding="utf-8")
     print(f"\nREADME.md updated with current stats.")
@@ -6,7 +6,7 @@ and generates a download manifest.
 
 import os
 import sys
-import json
+import asyncio
 import hashlib
 import re
 import time
@@ -14,17 +14,22 @@ import urllib.request
 import urllib.parse
 import urllib.error
 import ssl
+import socket
 from pathlib import Path
 from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # Add scripts dir to path for import
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from master_urls import get_all_urls
+from catalog_io import json_line, write_json
 
 # Directories
 BASE_DIR = Path(__file__).parent.parent
 DOWNLOAD_DIR = BASE_DIR / "pdfs" / "_downloads"
 MANIFEST_FILE = BASE_DIR / "catalog" / "download_manifest.json"
+PROGRESS_FILE = BASE_DIR / "catalog" / "download_manifest.jsonl"
 LOG_FILE = BASE_DIR / "catalog" / "download_log.txt"
 
 # Create SSL context that doesn't verify (some old sites have bad certs)
@@ -32,16 +37,39 @@ SSL_CTX = ssl.create_default_context()
 SSL_CTX.check_hostname = False
 SSL_CTX.verify_mode = ssl.CERT_NONE
 
+# Download concurrency: overall cap, plus per-host caps and delays to stay polite
+MAX_CONCURRENT_DOWNLOADS = 16
+HOST_LIMIT = 8
+HOST_DELAY = 0.5
+GDOCS_HOST_LIMIT = 2
+GDOCS_DELAY = 1.5  # Google rate limiting
+
 # User agent
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
+# One opener for every request: urlopen(context=...) rebuilds the whole
+# handler chain per call. Stdlib urllib still opens a new connection each time.
+OPENER = urllib.request.build_opener(urllib.request.HTTPSHandler(context=SSL_CTX))
+OPENER.addheaders = [("User-Agent", USER_AGENT)]
+
+# How much of a Google Docs HTML response to scan for the confirm token
+GDOCS_PEEK_BYTES = 65536
+
+# Precompiled patterns
+BAD_CHARS_RE = re.compile(r'[<>:"/\\|?*]')
+WHITESPACE_RE = re.compile(r'\s+')
+DASHES_RE = re.compile(r'-+')
+GDOCS_ID_PARAM_RE = re.compile(r'[?&]id=([a-zA-Z0-9_-]+)')
+GDOCS_FILE_PATH_RE = re.compile(r'/file/d/([a-zA-Z0-9_-]+)')
+GDOCS_CONFIRM_RE = re.compile(rb'confirm=([a-zA-Z0-9_-]+)')
+
 
 def sanitize_filename(name):
     """Create a safe filename from a title."""
     # Remove/replace problematic characters
-    name = re.sub(r'[<>:"/\\|?*]', '', name)
-    name = re.sub(r'\s+', '-', name.strip())
-    name = re.sub(r'-+', '-', name)
+    name = BAD_CHARS_RE.sub('', name)
+    name = WHITESPACE_RE.sub('-', name.strip())
+    name = DASHES_RE.sub('-', name)
     name = name.strip('-')
     # Truncate to reasonable length
     if len(name) > 120:
@@ -52,13 +80,13 @@ def sanitize_filename(name):
 def convert_gdocs_url(url):
     """Convert Google Docs/Drive URL to direct download URL."""
     # Format: https://docs.google.com/open?id=XXXXX
-    match = re.search(r'[?&]id=([a-zA-Z0-9_-]+)', url)
+    match = GDOCS_ID_PARAM_RE.search(url)
     if match:
         file_id = match.group(1)
         return f"https://docs.google.com/uc?export=download&id={file_id}"
 
     # Format: https://docs.google.com/file/d/XXXXX/edit
-    match = re.search(r'/file/d/([a-zA-Z0-9_-]+)', url)
+    match = GDOCS_FILE_PATH_RE.search(url)
     if match:
         file_id = match.group(1)
         return f"https://docs.google.com/uc?export=download&id={file_id}"
@@ -67,59 +95,50 @@ def convert_gdocs_url(url):
 
 
 def sha256_file(filepath):
-    """Compute SHA-256 hash of a file."""
-    h = hashlib.sha256()
+    """Compute SHA-256 hash of a file (read loop runs in C)."""
     with open(filepath, 'rb') as f:
-        while True:
-            chunk = f.read(8192)
-            if not chunk:
-                break
-            h.update(chunk)
-    return h.hexdigest()
+        return hashlib.file_digest(f, "sha256").hexdigest()
 
 
 def download_file(url, dest_path, max_retries=2):
-    """Download a file with retries. Returns (success, filesize, error_msg)."""
+    """Download a file with retries, hashing it as it streams to disk.
+    Returns (success, filesize, sha256_hex, error_msg)."""
     for attempt in range(max_retries + 1):
         try:
-            req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
-            with urllib.request.urlopen(req, context=SSL_CTX, timeout=60) as response:
+            with OPENER.open(url, timeout=60) as response:
                 content_type = response.headers.get('Content-Type', '')
 
                 # Check if Google is asking for confirmation (large file warning)
+                data = b""
                 if 'text/html' in content_type and 'docs.google.com' in url:
-                    # Read and check for confirmation page
-                    data = response.read()
+                    # The confirmation page is small, so only peek at the start of the body
+                    data = response.read(GDOCS_PEEK_BYTES)
                     # Try to find direct download link in HTML
-                    confirm_match = re.search(rb'confirm=([a-zA-Z0-9_-]+)', data)
+                    confirm_match = GDOCS_CONFIRM_RE.search(data)
                     if confirm_match:
                         confirm_code = confirm_match.group(1).decode()
                         new_url = url + f"&confirm={confirm_code}"
-                        req2 = urllib.request.Request(new_url, headers={"User-Agent": USER_AGENT})
-                        with urllib.request.urlopen(req2, context=SSL_CTX, timeout=60) as resp2:
+                        with OPENER.open(new_url, timeout=60) as resp2:
                             with open(dest_path, 'wb') as f:
                                 data2 = resp2.read()
                                 f.write(data2)
-                                return True, len(data2), None
-                    else:
-                        # It might still be the actual PDF despite content-type header
-                        # Check if data starts with PDF magic bytes
-                        if data[:4] == b'%PDF':
-                            with open(dest_path, 'wb') as f:
-                                f.write(data)
-                            return True, len(data), None
-                        else:
-                            # Save the HTML anyway for debugging, but mark as failed
-                            return False, 0, f"Got HTML instead of PDF (content-type: {content_type})"
+                                return True, len(data2), hashlib.sha256(data2).hexdigest(), None
+                    elif not data.startswith(b'%PDF'):
+                        return False, 0, None, f"Got HTML instead of PDF (content-type: {content_type})"
+                    # Otherwise it is the actual PDF despite the content-type header;
+                    # keep what was peeked and stream the rest below
 
                 # Normal download
+                h = hashlib.sha256(data)
                 with open(dest_path, 'wb') as f:
-                    total = 0
+                    f.write(data)
+                    total = len(data)
                     while True:
                         chunk = response.read(65536)
                         if not chunk:
                             break
                         f.write(chunk)
+                        h.update(chunk)
                         total += len(chunk)
 
                 # Verify it's actually a PDF (or at least not tiny HTML error page)
@@ -128,27 +147,185 @@ def download_file(url, dest_path, max_retries=2):
                         header = f.read(50)
                     if b'%PDF' not in header:
                         os.remove(dest_path)
-                        return False, 0, f"Downloaded file too small ({total} bytes) and not a PDF"
+                        return False, 0, None, f"Downloaded file too small ({total} bytes) and not a PDF"
 
-                return True, total, None
+                return True, total, h.hexdigest(), None
 
         except urllib.error.HTTPError as e:
             if attempt < max_retries:
                 time.sleep(2 * (attempt + 1))
                 continue
-            return False, 0, f"HTTP {e.code}: {e.reason}"
+            return False, 0, None, f"HTTP {e.code}: {e.reason}"
         except urllib.error.URLError as e:
             if attempt < max_retries:
                 time.sleep(2 * (attempt + 1))
                 continue
-            return False, 0, f"URL Error: {e.reason}"
+            return False, 0, None, f"URL Error: {e.reason}"
         except Exception as e:
             if attempt < max_retries:
                 time.sleep(2 * (attempt + 1))
                 continue
-            return False, 0, str(e)
+            return False, 0, None, str(e)
+
+    return False, 0, None, "Max retries exceeded"
+
+
+def prewarm_dns(urls):
+    """Look up every unique host once, in parallel, before downloading.
+    Saves a lookup per request wherever the system caches DNS answers."""
+    hosts = {urllib.parse.urlparse(url).hostname for url in urls} - {None}
+
+    def resolve(host):
+        try:
+            socket.getaddrinfo(host, 443, type=socket.SOCK_STREAM)
+        except OSError:
+            pass  # The download itself will report the failure
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        list(executor.map(resolve, hosts))
+
+
+async def download_all(all_urls, manifest, log_lines, progress):
+    """Download every URL concurrently and record the results in the manifest.
+
+    Downloads overlap across hosts, bounded by MAX_CONCURRENT_DOWNLOADS and a
+    per-host limit. Dedup and manifest updates still happen strictly in URL
+    order, so the first copy of a file wins exactly as in a serial run.
+    Each result is also appended to the progress file as one JSON line.
+    """
+    total = len(all_urls)
+    seen_hashes = {}  # hash -> first file info
+    download_slots = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    host_slots = {}
+    # Entries that share a filename must not touch the file at the same time
+    file_locks = defaultdict(asyncio.Lock)
+    recorded = [asyncio.Event() for _ in all_urls]
+    # Downloads get their own threads: the loop's default executor is smaller
+    # than MAX_CONCURRENT_DOWNLOADS on most machines and also hashes cached files
+    loop = asyncio.get_running_loop()
+    download_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DOWNLOADS)
+
+    def save_progress(status, data):
+        progress.write(json_line({"status": status, **data}))
+        progress.flush()
+
+    def record(i, entry, filename, dest_path, part_path, download_url, is_gdocs, cached, result):
+        url = entry["url"]
+        title = entry["title"]
+        source = entry["source"]
+
+        success, file_size, file_hash, error = result
+        if not success:
+            if part_path is not None:
+                part_path.unlink(missing_ok=True)
+            failure = {
+                "title": title,
+                "url": url,
+                "download_url": download_url,
+                "source": source,
+                "error": error
+            }
+            manifest["failed"] += 1
+            manifest["failures"].append(failure)
+            save_progress("failed", failure)
+            log_msg = f"[{i}/{total}] FAIL: {title} - {error}"
+            print(log_msg)
+            log_lines.append(log_msg)
+            return
 
-    return False, 0, "Max retries exceeded"
+        if cached:
+            dup_label, ok_label = "SKIP DUP", "CACHED"
+        else:
+            dup_label, ok_label = "DUP", "OK"
+
+        # Check for duplicate
+        if file_hash in seen_hashes:
+            manifest["duplicates"] += 1
+            manifest["duplicate_map"][filename] = seen_hashes[file_hash]["filename"]
+            save_progress("duplicate", {"filename": filename, "duplicate_of": seen_hashes[file_hash]["filename"]})
+            log_msg = f"[{i}/{total}] {dup_label}: {title} (dup of {seen_hashes[file_hash]['title']})"
+            print(log_msg)
+            log_lines.append(log_msg)
+            # Fresh duplicates never reach dest_path
+            os.remove(dest_path if cached else part_path)
+        else:
+            if not cached:
+                os.replace(part_path, dest_path)
+            seen_hashes[file_hash] = {"filename": filename, "title": title}
+            item = {
+                "filename": filename,
+                "title": title,
+                "source": source,
+                "original_url": url,
+                "sha256": file_hash,
+                "size_bytes": file_size,
+                "is_gdocs": is_gdocs
+            }
+            manifest["successful"] += 1
+            manifest["items"].append(item)
+            save_progress("ok", item)
+            log_msg = f"[{i}/{total}] {ok_label}: {title} ({file_size:,} bytes)"
+            print(log_msg)
+            log_lines.append(log_msg)
+
+    async def worker(i, entry):
+        url = entry["url"]
+        title = entry["title"]
+
+        # Convert Google Docs URLs
+        download_url = url
+        is_gdocs = False
+        if "docs.google.com" in url:
+            download_url = convert_gdocs_url(url)
+            is_gdocs = True
+
+        # Create filename
+        filename = sanitize_filename(title) + ".pdf"
+        dest_path = DOWNLOAD_DIR / filename
+
+        async with file_locks[filename]:
+            # Skip if already downloaded (resume support)
+            try:
+                st = dest_path.stat()
+            except FileNotFoundError:
+                st = None
+            cached = st is not None and st.st_size > 0
+            part_path = None
+            if cached:
+                # Hash in a worker thread so cached files are hashed in
+                # parallel and overlap with downloads still in flight
+                file_hash = await asyncio.to_thread(sha256_file, dest_path)
+                result = (True, st.st_size, file_hash, None)
+            else:
+                host = urllib.parse.urlparse(download_url).netloc
+                if host not in host_slots:
+                    host_slots[host] = asyncio.Semaphore(GDOCS_HOST_LIMIT if is_gdocs else HOST_LIMIT)
+                async with download_slots, host_slots[host]:
+                    # Download beside dest_path so the final os.replace is atomic.
+                    # file_locks keeps the name unique; a leftover from an
+                    # interrupted run is simply overwritten.
+                    part_path = dest_path.with_name(dest_path.name + ".part")
+                    print(f"[{i}/{total}] Downloading: {title}...")
+                    try:
+                        result = await loop.run_in_executor(download_pool, download_file, download_url, part_path)
+                    except BaseException:
+                        part_path.unlink(missing_ok=True)
+                        raise
+                    # Small delay to be polite before this host slot is reused
+                    await asyncio.sleep(GDOCS_DELAY if is_gdocs else HOST_DELAY)
+
+            # Record results in URL order
+            if i > 1:
+                await recorded[i - 2].wait()
+            try:
+                record(i, entry, filename, dest_path, part_path, download_url, is_gdocs, cached, result)
+            finally:
+                recorded[i - 1].set()
+
+    with download_pool:
+        async with asyncio.TaskGroup() as tg:
+            for i, entry in enumerate(all_urls, 1):
+                tg.create_task(worker(i, entry))
 
 
 def main():
@@ -175,102 +352,13 @@ def main():
         "duplicate_map": {}
     }
 
-    seen_hashes = {}  # hash -> first file info
-    log_lines = []
-
-    for i, entry in enumerate(all_urls, 1):
-        url = entry["url"]
-        title = entry["title"]
-        source = entry["source"]
-
-        # Convert Google Docs URLs
-        download_url = url
-        is_gdocs = False
-        if "docs.google.com" in url:
-            download_url = convert_gdocs_url(url)
-            is_gdocs = True
+    prewarm_dns(entry["url"] for entry in all_urls)
 
-        # Create filename
-        filename = sanitize_filename(title) + ".pdf"
-        dest_path = DOWNLOAD_DIR / filename
-
-        # Skip if already downloaded (resume support)
-        if dest_path.exists() and dest_path.stat().st_size > 0:
-            file_hash = sha256_file(dest_path)
-            file_size = dest_path.stat().st_size
-
-            if file_hash in seen_hashes:
-                manifest["duplicates"] += 1
-                manifest["duplicate_map"][filename] = seen_hashes[file_hash]["filename"]
-                log_msg = f"[{i}/{total}] SKIP DUP: {title} (dup of {seen_hashes[file_hash]['title']})"
-                print(log_msg)
-                log_lines.append(log_msg)
-                os.remove(dest_path)
-            else:
-                seen_hashes[file_hash] = {"filename": filename, "title": title}
-                manifest["successful"] += 1
-                manifest["items"].append({
-                    "filename": filename,
-                    "title": title,
-                    "source": source,
-                    "original_url": url,
-                    "sha256": file_hash,
-                    "size_bytes": file_size,
-                    "is_gdocs": is_gdocs
-                })
-                log_msg = f"[{i}/{total}] CACHED: {title} ({file_size:,} bytes)"
-                print(log_msg)
-                log_lines.append(log_msg)
-            continue
-
-        # Download
-        print(f"[{i}/{total}] Downloading: {title}...")
-        success, file_size, error = download_file(download_url, dest_path)
-
-        if success:
-            file_hash = sha256_file(dest_path)
-
-            # Check for duplicate
-            if file_hash in seen_hashes:
-                manifest["duplicates"] += 1
-                manifest["duplicate_map"][filename] = seen_hashes[file_hash]["filename"]
-                log_msg = f"[{i}/{total}] DUP: {title} (dup of {seen_hashes[file_hash]['title']})"
-                print(log_msg)
-                log_lines.append(log_msg)
-                os.remove(dest_path)
-            else:
-                seen_hashes[file_hash] = {"filename": filename, "title": title}
-                manifest["successful"] += 1
-                manifest["items"].append({
-                    "filename": filename,
-                    "title": title,
-                    "source": source,
-                    "original_url": url,
-                    "sha256": file_hash,
-                    "size_bytes": file_size,
-                    "is_gdocs": is_gdocs
-                })
-                log_msg = f"[{i}/{total}] OK: {title} ({file_size:,} bytes)"
-                print(log_msg)
-                log_lines.append(log_msg)
-        else:
-            manifest["failed"] += 1
-            manifest["failures"].append({
-                "title": title,
-                "url": url,
-                "download_url": download_url,
-                "source": source,
-                "error": error
-            })
-            log_msg = f"[{i}/{total}] FAIL: {title} - {error}"
-            print(log_msg)
-            log_lines.append(log_msg)
-
-        # Small delay to be polite
-        if is_gdocs:
-            time.sleep(1.5)  # Google rate limiting
-        else:
-            time.sleep(0.5)
+    log_lines = []
+    MANIFEST_FILE.parent.mkdir(parents=True, exist_ok=True)
+    # Results are streamed here as they land, so an interrupted run leaves a record
+    with open(PROGRESS_FILE, 'wb') as progress:
+        asyncio.run(download_all(all_urls, manifest, log_lines, progress))
 
     # Summary
     print(f"\n{'=' * 60}")
@@ -287,9 +375,7 @@ def main():
     print(f"  Total size: {manifest['total_size_mb']} MB")
 
     # Save manifest
-    MANIFEST_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
-        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    write_json(MANIFEST_FILE, manifest)
     print(f"\nManifest saved to: {MANIFEST_FILE}")
 
     # Save log
@@ -4,14 +4,28 @@ Extracts text from PDFs and generates concise content summaries.
 Also validates and refines categorization and scoring.
 """
 
+import os
+import sys
 import json
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from PyPDF2 import PdfReader
+from pypdf import PdfReader
+
+# Add scripts dir to path for import
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from catalog_io import catalog_stats, write_json
 
 BASE_DIR = Path(__file__).parent.parent
 CATALOG_FILE = BASE_DIR / "catalog" / "catalog.json"
 
+# Bump when summary generation changes so the next run redoes every item
+SUMMARY_VERSION = 1
+# Save progress to the catalog after this many updated items
+CHECKPOINT_EVERY = 25
+
+WHITESPACE_RE = re.compile(r'\s+')
+
 # Political/conspiracy content detected in PDF text triggers a flag for manual review.
 # These are checked against extracted text (not just title) to catch subtle cases.
 POLITICAL_TEXT_KEYWORDS = [
@@ -23,11 +37,43 @@ POLITICAL_TEXT_KEYWORDS = [
     "martial law takeover", "agenda 21 conspiracy",
 ]
 
+# Topics reported in summaries, in the order they are listed
+MAX_SUMMARY_TOPICS = 6
+IMPORTANT_TOPICS = [
+    "water", "fire", "shelter", "food", "navigation", "first aid",
+    "signaling", "survival", "medical", "weapons", "trapping",
+    "hunting", "fishing", "plants", "knots", "radio", "nuclear",
+    "decontamination", "evacuation", "emergency", "wounds",
+    "fractures", "burns", "cpr", "bleeding", "shock",
+    "canning", "preserving", "garden", "seeds", "soil",
+    "cold weather", "desert", "tropical", "sea survival",
+    "urban", "evasion", "concealment", "camouflage"
+]
+
+# Content overrides in refine_category: keywords in the opening text,
+# confirmed by keywords in the title
+NBC_TEXT_KEYWORDS = ("nuclear", "radiological", "fallout", "detonation")
+NBC_TITLE_KEYWORDS = ("nuclear", "nbc", "cbrn")
+MEDICAL_TEXT_KEYWORDS = ("first aid", "medical", "wound", "patient", "treatment")
+MEDICAL_TITLE_KEYWORDS = ("medical", "medicine", "first aid", "doctor", "dentist")
+
+# Large documents with these in the title are comprehensive references
+COMPREHENSIVE_TITLE_KEYWORDS = ("encyclopedia", "cyclopedia", "complete guide")
+
+# Core survival documents should always be essential
+ESSENTIAL_TITLES = [
+    "where there is no doctor", "where there is no dentist",
+    "fm 21-76", "nuclear war survival skills", "first aid",
+    "special forces medical", "survival and austere medicine",
+    "field hygiene", "preventive medicine", "citizen preparedness",
+    "bug out bag", "emergency plan", "survival kit"
+]
+
 
 def extract_text(pdf_path, max_pages=5):
     """Extract text from the first N pages of a PDF."""
     try:
-        reader = PdfReader(str(pdf_path))
+        reader = PdfReader(str(pdf_path), strict=False)
         num_pages = len(reader.pages)
         text_parts = []
 
@@ -41,22 +87,19 @@ def extract_text(pdf_path, max_pages=5):
 
         full_text = "\n".join(text_parts)
         # Clean up
-        full_text = re.sub(r'\s+', ' ', full_text)
+        full_text = WHITESPACE_RE.sub(' ', full_text)
         return full_text.strip(), num_pages
     except Exception as e:
         return "", 0
 
 
-def generate_summary(title, text, num_pages, category, size_bytes):
-    """Generate a concise summary from extracted text."""
+def generate_summary(title, text_lower, num_pages, category, size_bytes):
+    """Generate a concise summary from lowercased extracted text."""
     size_mb = round(size_bytes / (1024 * 1024), 2)
 
-    if not text or len(text) < 50:
+    if not text_lower or len(text_lower) < 50:
         return f"{title}. {num_pages}-page document ({size_mb} MB). Text extraction was limited; manual review recommended for accurate content summary."
 
-    # Try to identify key topics from the text
-    text_lower = text.lower()
-
     # Build summary based on what we can extract
     summary_parts = []
 
@@ -72,20 +115,11 @@ def generate_summary(title, text, num_pages, category, size_bytes):
 
     # Look for table of contents or chapter topics
     toc_keywords = []
-    important_topics = [
-        "water", "fire", "shelter", "food", "navigation", "first aid",
-        "signaling", "survival", "medical", "weapons", "trapping",
-        "hunting", "fishing", "plants", "knots", "radio", "nuclear",
-        "decontamination", "evacuation", "emergency", "wounds",
-        "fractures", "burns", "cpr", "bleeding", "shock",
-        "canning", "preserving", "garden", "seeds", "soil",
-        "cold weather", "desert", "tropical", "sea survival",
-        "urban", "evasion", "concealment", "camouflage"
-    ]
-
-    for topic in important_topics:
+    for topic in IMPORTANT_TOPICS:
         if topic in text_lower:
             toc_keywords.append(topic)
+            if len(toc_keywords) == MAX_SUMMARY_TOPICS:
+                break
 
     # Build the summary
     if summary_parts:
@@ -95,20 +129,18 @@ def generate_summary(title, text, num_pages, category, size_bytes):
 
     topics_str = ""
     if toc_keywords:
-        # Take top 5 most relevant
-        topics_str = f" Covers topics including {', '.join(toc_keywords[:6])}."
+        topics_str = f" Covers topics including {', '.join(toc_keywords)}."
 
     pages_str = f" {num_pages} pages, {size_mb} MB."
 
     return f"{title}. {base} providing guidance on {category.replace('-', ' ')} topics.{topics_str}{pages_str}"
 
 
-def check_political_text(text):
-    """Scan extracted PDF text for overtly political/conspiracy content.
+def check_political_text(text_lower):
+    """Scan lowercased PDF text for overtly political/conspiracy content.
     Returns list of matched keywords, or empty list if clean."""
-    if not text:
+    if not text_lower:
         return []
-    text_lower = text.lower()
     matches = []
     for keyword in POLITICAL_TEXT_KEYWORDS:
         if keyword in text_lower:
@@ -116,28 +148,25 @@ def check_political_text(text):
     return matches
 
 
-def refine_category(title, text, current_category):
-    """Refine category based on actual content."""
-    text_lower = (text or "").lower()
-    title_lower = title.lower()
-
+def refine_category(title_lower, text_head, current_category):
+    """Refine category based on actual content.
+    text_head is the first 1000 characters of the lowercased text."""
     # Strong overrides based on content
-    if any(k in text_lower[:1000] for k in ["nuclear", "radiological", "fallout", "detonation"]):
-        if current_category not in ["nuclear-cbrn"]:
-            if "nuclear" in title_lower or "nbc" in title_lower or "cbrn" in title_lower:
+    if any(k in text_head for k in NBC_TEXT_KEYWORDS):
+        if current_category != "nuclear-cbrn":
+            if any(k in title_lower for k in NBC_TITLE_KEYWORDS):
                 return "nuclear-cbrn"
 
-    if any(k in text_lower[:1000] for k in ["first aid", "medical", "wound", "patient", "treatment"]):
-        if current_category not in ["medicine"]:
-            if any(k in title_lower for k in ["medical", "medicine", "first aid", "doctor", "dentist"]):
+    if any(k in text_head for k in MEDICAL_TEXT_KEYWORDS):
+        if current_category != "medicine":
+            if any(k in title_lower for k in MEDICAL_TITLE_KEYWORDS):
                 return "medicine"
 
     return current_category
 
 
-def refine_score(title, text, current_score, num_pages, size_bytes):
+def refine_score(title_lower, current_score, num_pages, size_bytes):
     """Refine the tier score based on actual content analysis."""
-    title_lower = title.lower()
     size_mb = size_bytes / (1024 * 1024)
 
     # Very small checklists/reference cards should be essential if practical
@@ -145,24 +174,46 @@ def refine_score(title, text, current_score, num_pages, size_bytes):
         return "essential"
 
     # Comprehensive military manuals (large, detailed)
-    if size_mb > 15 and any(k in title_lower for k in ["encyclopedia", "cyclopedia", "complete guide"]):
+    if size_mb > 15 and any(k in title_lower for k in COMPREHENSIVE_TITLE_KEYWORDS):
         return "comprehensive"
 
     # Core survival documents should always be essential
-    essential_titles = [
-        "where there is no doctor", "where there is no dentist",
-        "fm 21-76", "nuclear war survival skills", "first aid",
-        "special forces medical", "survival and austere medicine",
-        "field hygiene", "preventive medicine", "citizen preparedness",
-        "bug out bag", "emergency plan", "survival kit"
-    ]
-    for et in essential_titles:
+    for et in ESSENTIAL_TITLES:
         if et in title_lower:
             return "essential"
 
     return current_score
 
 
+def process_item(args):
+    """Extract one PDF's text and work out its refined fields.
+    Runs in a worker process; main() applies the results to the catalog.
+    Returns (num_pages, political_matches, category, tier, summary)."""
+    pdf_path, title, category, tier, size_bytes = args
+
+    # Extract text
+    text, num_pages = extract_text(pdf_path)
+
+    # Lowercase once; every check below works on these
+    text_lower = text.lower()
+    title_lower = title.lower()
+
+    # Political content check on extracted text
+    political_matches = check_political_text(text_lower)
+
+    new_category = refine_category(title_lower, text_lower[:1000], category)
+    new_score = refine_score(title_lower, tier, num_pages, size_bytes)
+    summary = generate_summary(title, text_lower, num_pages, new_category, size_bytes)
+    return num_pages, political_matches, new_category, new_score, summary
+
+
+def save_catalog(catalog):
+    """Write the catalog via a temp file so an interrupted write keeps the old one."""
+    tmp_file = CATALOG_FILE.with_suffix(".json.tmp")
+    write_json(tmp_file, catalog)
+    os.replace(tmp_file, CATALOG_FILE)
+
+
 def main():
     with open(CATALOG_FILE) as f:
         catalog = json.load(f)
@@ -172,76 +223,98 @@ def main():
 
     updated = 0
     errors = 0
+    skipped = 0
     political_flags = []
 
-    for i, item in enumerate(catalog["items"], 1):
-        title = item["title"]
+    pdf_paths = []
+    for item in catalog["items"]:
+        # Summarized by this version already, e.g. before an interrupted run
+        if "summary" in item and item.get("summary_version") == SUMMARY_VERSION:
+            pdf_paths.append(False)
+            skipped += 1
+            continue
+
         path = item.get("path", "")
 
         if not path:
             path = f"pdfs/{item['category']}/{item['filename']}"
 
         pdf_path = BASE_DIR / path
+        pdf_paths.append(pdf_path if pdf_path.exists() else None)
+
+    # Extraction is CPU-bound, so spread it across processes; results come
+    # back in catalog order and are applied here in the main process
+    jobs = [
+        (pdf_path, item["title"], item["category"], item["tier"], item["size_bytes"])
+        for item, pdf_path in zip(catalog["items"], pdf_paths)
+        if pdf_path
+    ]
+    if skipped:
+        print(f"Skipping {skipped} PDFs already summarized")
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(process_item, jobs)
 
-        if not pdf_path.exists():
-            print(f"[{i}/{len(catalog['items'])}] MISSING: {title}")
-            errors += 1
-            continue
+        for i, (item, pdf_path) in enumerate(zip(catalog["items"], pdf_paths), 1):
+            title = item["title"]
 
-        # Extract text
-        text, num_pages = extract_text(pdf_path)
-
-        # Political content check on extracted text
-        political_matches = check_political_text(text)
-        if political_matches:
-            political_flags.append((title, political_matches))
-            item["relevance"] = "low"
-            item["political_flag"] = True
-            print(f"  ** POLITICAL CONTENT FLAGGED: {title}")
-            print(f"     Matched: {', '.join(political_matches)}")
-            print(f"     -> Set to low relevance. Manual review recommended.")
-
-        # Update page count
-        item["pages"] = num_pages
-
-        # Refine category
-        new_category = refine_category(title, text, item["category"])
-        if new_category != item["category"]:
-            print(f"  Category: {item['category']} -> {new_category}")
-            item["category"] = new_category
-
-        # Refine score
-        new_score = refine_score(title, text, item["tier"], num_pages, item["size_bytes"])
-        if new_score != item["tier"]:
-            print(f"  Tier: {item['tier']} -> {new_score}")
-            item["tier"] = new_score
-
-        # Generate summary
-        summary = generate_summary(title, text, num_pages, item["category"], item["size_bytes"])
-        item["summary"] = summary
-
-        updated += 1
-        size_mb = round(item["size_bytes"] / (1024 * 1024), 2)
-        print(f"[{i}/{len(catalog['items'])}] {title} ({num_pages}pp, {size_mb}MB)")
+            if pdf_path is False:
+                continue
+
+            if pdf_path is None:
+                print(f"[{i}/{len(catalog['items'])}] MISSING: {title}")
+                errors += 1
+                continue
+
+            num_pages, political_matches, new_category, new_score, summary = next(results)
+
+            # Political content check on extracted text
+            if political_matches:
+                political_flags.append((title, political_matches))
+                item["relevance"] = "low"
+                item["political_flag"] = True
+                print(f"  ** POLITICAL CONTENT FLAGGED: {title}")
+                print(f"     Matched: {', '.join(political_matches)}")
+                print(f"     -> Set to low relevance. Manual review recommended.")
+
+            # Update page count
+            item["pages"] = num_pages
+
+            # Refine category
+            if new_category != item["category"]:
+                print(f"  Category: {item['category']} -> {new_category}")
+                item["category"] = new_category
+
+            # Refine score
+            if new_score != item["tier"]:
+                print(f"  Tier: {item['tier']} -> {new_score}")
+                item["tier"] = new_score
+
+            # Generate summary
+            item["summary"] = summary
+            item["summary_version"] = SUMMARY_VERSION
+
+            updated += 1
+            size_mb = round(item["size_bytes"] / (1024 * 1024), 2)
+            print(f"[{i}/{len(catalog['items'])}] {title} ({num_pages}pp, {size_mb}MB)")
+
+            if updated % CHECKPOINT_EVERY == 0:
+                save_catalog(catalog)
 
     # Recalculate stats
-    cc = {}
-    tc = {"essential": 0, "standard": 0, "comprehensive": 0}
-    for item in catalog["items"]:
-        cc[item["category"]] = cc.get(item["category"], 0) + 1
-        tc[item["tier"]] = tc.get(item["tier"], 0) + 1
+    cc, tc, _ = catalog_stats(catalog["items"])
 
     catalog["stats"]["categories"] = cc
     catalog["stats"]["tiers"] = tc
 
     # Save updated catalog
-    with open(CATALOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(catalog, f, indent=2, ensure_ascii=False)
+    save_catalog(catalog)
 
     print(f"\n{'=' * 60}")
     print(f"SUMMARY GENERATION COMPLETE")
     print(f"  Updated:  {updated}")
     print(f"  Errors:   {errors}")
+    if skipped:
+        print(f"  Skipped:  {skipped} (already summarized)")
     if political_flags:
         print(f"\n  POLITICAL CONTENT FLAGGED: {len(political_flags)}")
         print(f"  These items were set to low relevance and need manual review:")
@@ -3,12 +3,21 @@ Improve catalog summaries with hand-written descriptions for essential items
 and better auto-generated ones for the rest.
 """
 
+import os
+import sys
 import json
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from PyPDF2 import PdfReader
+from pypdf import PdfReader
+
+# Add scripts dir to path for import
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from catalog_io import write_json
 
 BASE_DIR = Path(__file__).parent.parent
 CATALOG_FILE = BASE_DIR / "catalog" / "catalog.json"
+# Extracted text snippets keyed by PDF sha256, so unchanged files are not reparsed
+TEXT_CACHE_FILE = BASE_DIR / "catalog" / "summary_text_cache.json"
 
 # Hand-written summaries for essential tier items
 MANUAL_SUMMARIES = {
@@ -48,11 +57,28 @@ MANUAL_SUMMARIES = {
     "Sweden In Case of Crisis or War": "Swedish government civil defense booklet distributed to all households covering wartime preparedness, shelter procedures, supply stockpiling, and crisis communication. Notable for direct government guidance on military threat preparedness.",
 }
 
+# How auto-generated summaries describe each category's topics
+CATEGORY_DESCRIPTIONS = {
+    "survival": "wilderness and general survival",
+    "medicine": "medical and health care",
+    "preparedness": "emergency preparedness and planning",
+    "military": "military operations and tactics",
+    "nuclear-cbrn": "nuclear, chemical, biological, and radiological defense",
+    "food-agriculture": "food procurement, preservation, and agriculture",
+    "diy-repair": "practical DIY skills and home management",
+    "navigation": "navigation and communication",
+    "self-defense": "self-defense and personal security",
+    "shelter-construction": "shelter design and construction",
+    "water-sanitation": "water treatment and sanitation",
+    "reference": "quick reference",
+    "education": "general survival education",
+}
+
 
 def extract_text_snippet(pdf_path, max_pages=3):
     """Extract a text snippet for auto-summary generation."""
     try:
-        reader = PdfReader(str(pdf_path))
+        reader = PdfReader(str(pdf_path), strict=False)
         num_pages = len(reader.pages)
         text_parts = []
         for i in range(min(max_pages, num_pages)):
@@ -92,52 +118,79 @@ def auto_summary(title, text, num_pages, size_bytes, category):
 
     org_str = f"{org} " if org else ""
 
-    cat_desc = {
-        "survival": "wilderness and general survival",
-        "medicine": "medical and health care",
-        "preparedness": "emergency preparedness and planning",
-        "military": "military operations and tactics",
-        "nuclear-cbrn": "nuclear, chemical, biological, and radiological defense",
-        "food-agriculture": "food procurement, preservation, and agriculture",
-        "diy-repair": "practical DIY skills and home management",
-        "navigation": "navigation and communication",
-        "self-defense": "self-defense and personal security",
-        "shelter-construction": "shelter design and construction",
-        "water-sanitation": "water treatment and sanitation",
-        "reference": "quick reference",
-        "education": "general survival education",
-    }.get(category, "general reference")
+    cat_desc = CATEGORY_DESCRIPTIONS.get(category, "general reference")
 
     return f"{title}. {org_str}{num_pages}-page reference covering {cat_desc} topics. {size_mb} MB."
 
 
+def load_text_cache():
+    """Load the sha256 -> text snippet cache, or start empty."""
+    try:
+        with open(TEXT_CACHE_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
 def main():
     with open(CATALOG_FILE) as f:
         catalog = json.load(f)
 
+    # Category and tier values repeat across every item; keep one copy of each
+    for item in catalog["items"]:
+        item["category"] = sys.intern(item["category"])
+        item["tier"] = sys.intern(item["tier"])
+
+    text_cache = load_text_cache()
     manual_count = 0
     auto_count = 0
 
+    # Find the PDFs whose text is not cached yet. Items are keyed by sha256
+    # (or by path if they have none) so identical files are parsed once.
+    item_keys = []
+    pending = {}
     for item in catalog["items"]:
+        key = None
+        if item["title"] not in MANUAL_SUMMARIES:
+            path = item.get("path", f"pdfs/{item['category']}/{item['filename']}")
+            pdf_path = BASE_DIR / path
+            if pdf_path.exists():
+                key = item.get("sha256") or pdf_path
+                if key not in text_cache:
+                    pending.setdefault(key, pdf_path)
+        item_keys.append(key)
+
+    # Parsing is CPU-bound, so extract in parallel across processes
+    if pending:
+        with ProcessPoolExecutor() as executor:
+            snippets = executor.map(extract_text_snippet, pending.values())
+            for key, (text, _) in zip(pending, snippets):
+                text_cache[key] = text
+
+    for item, key in zip(catalog["items"], item_keys):
         title = item["title"]
 
         # Check for manual summary
-        if title in MANUAL_SUMMARIES:
-            item["summary"] = MANUAL_SUMMARIES[title]
+        manual = MANUAL_SUMMARIES.get(title)
+        if manual is not None:
+            item["summary"] = manual
             manual_count += 1
         else:
             # Generate improved auto-summary
-            path = item.get("path", f"pdfs/{item['category']}/{item['filename']}")
-            pdf_path = BASE_DIR / path
-            text, _ = extract_text_snippet(pdf_path) if pdf_path.exists() else ("", 0)
+            text = text_cache[key] if key is not None else ""
             item["summary"] = auto_summary(
                 title, text, item.get("pages", 0),
                 item["size_bytes"], item["category"]
             )
             auto_count += 1
 
-    with open(CATALOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(catalog, f, indent=2, ensure_ascii=False)
+    write_json(CATALOG_FILE, catalog)
+
+    # Only sha256 keys are stable across runs. The cache is never reviewed,
+    # so it is written compact.
+    with open(TEXT_CACHE_FILE, "w", encoding="utf-8") as f:
+        json.dump({k: v for k, v in text_cache.items() if isinstance(k, str)}, f,
+                  ensure_ascii=False, separators=(",", ":"))
 
     print(f"Updated summaries: {manual_count} manual, {auto_count} auto-generated")
     print(f"Catalog saved to {CATALOG_FILE}")
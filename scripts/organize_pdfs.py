@@ -5,10 +5,15 @@ Moves PDFs from _downloads into their assigned category folders.
 
 import os
 import sys
+import errno
 import json
 import shutil
 from pathlib import Path
 
+# Add scripts dir to path for import
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from catalog_io import write_json
+
 BASE_DIR = Path(__file__).parent.parent
 DOWNLOAD_DIR = BASE_DIR / "pdfs" / "_downloads"
 PDFS_DIR = BASE_DIR / "pdfs"
@@ -21,6 +26,7 @@ def main():
 
     moved = 0
     errors = 0
+    made_dirs = set()
 
     for item in catalog["items"]:
         filename = item["filename"]
@@ -37,19 +43,25 @@ def main():
             errors += 1
             continue
 
-        # Ensure category dir exists
-        dest_dir.mkdir(parents=True, exist_ok=True)
+        # Ensure category dir exists (once per category)
+        if category not in made_dirs:
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            made_dirs.add(category)
 
-        # Move file
-        shutil.move(str(src), str(dest))
+        # Move file; a plain rename within pdfs/, copying only across filesystems
+        try:
+            os.replace(src, dest)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(str(src), str(dest))
         moved += 1
 
         # Update catalog with relative path
         item["path"] = f"pdfs/{category}/{filename}"
 
     # Save updated catalog
-    with open(CATALOG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(catalog, f, indent=2, ensure_ascii=False)
+    write_json(CATALOG_FILE, catalog)
 
     print(f"\nOrganized {moved} PDFs into category directories")
     if errors:
@@ -57,11 +69,13 @@ def main():
 
     # Show directory structure
     print(f"\nDirectory structure:")
-    for cat_dir in sorted(PDFS_DIR.iterdir()):
-        if cat_dir.is_dir() and cat_dir.name != "_downloads":
-            count = len(list(cat_dir.glob("*.pdf")))
-            if count > 0:
-                print(f"  pdfs/{cat_dir.name}/  ({count} PDFs)")
+    with os.scandir(PDFS_DIR) as entries:
+        cat_dirs = [e for e in entries if e.is_dir() and e.name != "_downloads"]
+    for cat_dir in sorted(cat_dirs, key=lambda e: e.name):
+        with os.scandir(cat_dir.path) as files:
+            count = sum(1 for f in files if f.name.endswith(".pdf"))
+        if count > 0:
+            print(f"  pdfs/{cat_dir.name}/  ({count} PDFs)")
 
 
 if __name__ == "__main__":
@@ -15,10 +15,17 @@ import urllib.request
 import urllib.parse
 import urllib.error
 import ssl
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from http.cookiejar import CookieJar
 
+# Add scripts dir to path for import
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from catalog_io import write_json
+
 BASE_DIR = Path(__file__).parent.parent
 DOWNLOAD_DIR = BASE_DIR / "pdfs" / "_downloads"
 MANIFEST_FILE = BASE_DIR / "catalog" / "download_manifest.json"
@@ -30,44 +37,102 @@ SSL_CTX.verify_mode = ssl.CERT_NONE
 
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
+# One opener shared by every cookie-less retry instead of one per urlopen call
+OPENER = urllib.request.build_opener(urllib.request.HTTPSHandler(context=SSL_CTX))
+OPENER.addheaders = [("User-Agent", USER_AGENT)]
+
+# Characters not allowed in saved filenames
+BAD_CHARS = '<>:"/\\|?*'
+
+# Precompiled patterns
+# Runs of forbidden characters, whitespace and dashes, sanitized in one pass
+SANITIZE_RE = re.compile(r'[\s\-<>:"/\\|?*]+')
+GDOCS_ID_PARAM_RE = re.compile(r'[?&]id=([a-zA-Z0-9_-]+)')
+GDOCS_FILE_PATH_RE = re.compile(r'/file/d/([a-zA-Z0-9_-]+)')
+GDOCS_CONFIRM_RE = re.compile(rb'confirm=([a-zA-Z0-9_-]+)')
+
+# How much of a Google Drive HTML page to read when looking for the confirm token
+GDOCS_PEEK_BYTES = 65536
+
+# Dead domains that are fetched from the Wayback Machine instead
+WAYBACK_DOMAINS = ('ready4itall.org', 'kazvswild.com', 'landsurvival.com', 'survivorlibrary.com')
+
+# Retry concurrency: overall workers, per-host cap, and spacing between
+# request starts on the same host
+RETRY_WORKERS = 16
+MAX_PER_HOST = 4
+HOST_DELAY = 1.0
+
+
+def _sanitize_run(match):
+    # Forbidden characters are dropped; a run with any whitespace or dash becomes one '-'
+    return '-' if match.group().strip(BAD_CHARS) else ''
+
 
 def sanitize_filename(name):
-    name = re.sub(r'[<>:"/\\|?*]', '', name)
-    name = re.sub(r'\s+', '-', name.strip())
-    name = re.sub(r'-+', '-', name)
-    name = name.strip('-')
+    name = SANITIZE_RE.sub(_sanitize_run, name).strip('-')
     if len(name) > 120:
         name = name[:120]
     return name
 
 
-def sha256_file(filepath):
-    h = hashlib.sha256()
-    with open(filepath, 'rb') as f:
-        while True:
-            chunk = f.read(8192)
-            if not chunk:
-                break
-            h.update(chunk)
-    return h.hexdigest()
+def save_stream(response, dest_path, head=b""):
+    """Write head plus the rest of response to dest_path, hashing as it goes.
+    Returns (size, sha256_hex)."""
+    h = hashlib.sha256(head)
+    size = len(head)
+    try:
+        with open(dest_path, 'wb') as f:
+            f.write(head)
+            while True:
+                chunk = response.read(1 << 20)
+                if not chunk:
+                    break
+                f.write(chunk)
+                h.update(chunk)
+                size += len(chunk)
+    except BaseException:
+        # Never leave a truncated file behind
+        dest_path.unlink(missing_ok=True)
+        raise
+    return size, h.hexdigest()
 
 
 def extract_gdocs_id(url):
     """Extract file ID from various Google Docs URL formats."""
-    match = re.search(r'[?&]id=([a-zA-Z0-9_-]+)', url)
+    match = GDOCS_ID_PARAM_RE.search(url)
     if match:
         return match.group(1)
-    match = re.search(r'/file/d/([a-zA-Z0-9_-]+)', url)
+    match = GDOCS_FILE_PATH_RE.search(url)
     if match:
         return match.group(1)
     return None
 
 
+def fetch_gdocs(opener, url, dest_path, ranged=False):
+    """GET a Google Drive URL, streaming it to dest_path if the body is a PDF.
+    ranged asks for just the first GDOCS_PEEK_BYTES, enough to find a confirm token.
+    Returns ((size, sha256_hex), None) for a saved PDF, else (None, peeked_bytes)."""
+    headers = {"User-Agent": USER_AGENT}
+    if ranged:
+        headers["Range"] = f"bytes=0-{GDOCS_PEEK_BYTES - 1}"
+    req = urllib.request.Request(url, headers=headers)
+    with opener.open(req, timeout=60) as response:
+        head = response.read(5)
+        if not head.startswith(b'%PDF'):
+            return None, head + response.read(GDOCS_PEEK_BYTES)
+        if response.status != 206:
+            return save_stream(response, dest_path, head), None
+    # A PDF after all, but only its first bytes were requested
+    return fetch_gdocs(opener, url, dest_path)
+
+
 def try_gdocs_download(url, dest_path):
-    """Try multiple strategies for Google Docs/Drive downloads."""
+    """Try multiple strategies for Google Docs/Drive downloads.
+    Returns (success, size, sha256_hex, error_msg)."""
     file_id = extract_gdocs_id(url)
     if not file_id:
-        return False, 0, "Could not extract file ID"
+        return False, 0, None, "Could not extract file ID"
 
     strategies = [
         f"https://drive.google.com/uc?export=download&id={file_id}",
@@ -76,55 +141,45 @@ def try_gdocs_download(url, dest_path):
         f"https://drive.usercontent.google.com/download?id={file_id}&export=download&confirm=t",
     ]
 
+    # One cookie jar per file, kept across strategies for Google's confirmation cookies
+    cj = CookieJar()
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(cj),
+        urllib.request.HTTPSHandler(context=SSL_CTX)
+    )
+
     for i, download_url in enumerate(strategies):
         try:
-            # Use cookie jar for Google's confirmation cookies
-            cj = CookieJar()
-            opener = urllib.request.build_opener(
-                urllib.request.HTTPCookieProcessor(cj),
-                urllib.request.HTTPSHandler(context=SSL_CTX)
-            )
-
-            req = urllib.request.Request(download_url, headers={
-                "User-Agent": USER_AGENT,
-            })
-
-            response = opener.open(req, timeout=60)
-            content_type = response.headers.get('Content-Type', '')
-
-            data = response.read()
-
-            # Check if it's a PDF
-            if data[:4] == b'%PDF' or data[:5] == b'%PDF-':
-                with open(dest_path, 'wb') as f:
-                    f.write(data)
-                return True, len(data), None
+            # Most strategies answer with an HTML page, and only its first bytes
+            # are needed to look for a confirm token
+            saved, data = fetch_gdocs(opener, download_url, dest_path, ranged=True)
+            if saved:
+                size, file_hash = saved
+                return True, size, file_hash, None
 
             # Check for download warning page (virus scan for large files)
             if b'confirm=' in data or b'download_warning' in data:
                 # Try to extract confirm token
-                confirm_match = re.search(rb'confirm=([a-zA-Z0-9_-]+)', data)
+                confirm_match = GDOCS_CONFIRM_RE.search(data)
                 if confirm_match:
                     confirm = confirm_match.group(1).decode()
                     confirm_url = f"https://drive.google.com/uc?export=download&id={file_id}&confirm={confirm}"
-                    req2 = urllib.request.Request(confirm_url, headers={"User-Agent": USER_AGENT})
-                    resp2 = opener.open(req2, timeout=60)
-                    data2 = resp2.read()
-                    if data2[:4] == b'%PDF':
-                        with open(dest_path, 'wb') as f:
-                            f.write(data2)
-                        return True, len(data2), None
+                    saved, _ = fetch_gdocs(opener, confirm_url, dest_path)
+                    if saved:
+                        size, file_hash = saved
+                        return True, size, file_hash, None
 
         except Exception as e:
             continue
 
         time.sleep(1)
 
-    return False, 0, "All Google Drive download strategies failed"
+    return False, 0, None, "All Google Drive download strategies failed"
 
 
 def try_infobooks_download(url, dest_path):
-    """Try downloading from infobooks.org with proper headers."""
+    """Try downloading from infobooks.org with proper headers.
+    Returns (success, size, sha256_hex, error_msg)."""
     strategies = [
         {"User-Agent": USER_AGENT, "Referer": "https://www.infobooks.org/free-pdf-books/self-improvement/survival/"},
         {"User-Agent": USER_AGENT, "Referer": "https://www.infobooks.org/", "Accept": "application/pdf,*/*"},
@@ -134,47 +189,83 @@ def try_infobooks_download(url, dest_path):
     for headers in strategies:
         try:
             req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req, context=SSL_CTX, timeout=60) as response:
-                data = response.read()
-                if data[:4] == b'%PDF' or len(data) > 5000:
-                    with open(dest_path, 'wb') as f:
-                        f.write(data)
-                    return True, len(data), None
+            with OPENER.open(req, timeout=60) as response:
+                head = response.read(5)
+                content_type = response.headers.get("Content-Type", "")
+                # Trust the magic bytes or the server's content type, never the
+                # size: a large HTML error page is not a PDF
+                if head.startswith(b'%PDF') or content_type.startswith("application/pdf"):
+                    size, file_hash = save_stream(response, dest_path, head)
+                    return True, size, file_hash, None
+            last_error = f"Not a PDF (content-type: {content_type})"
         except Exception as e:
             last_error = str(e)
             continue
         time.sleep(1)
 
-    return False, 0, f"All infobooks strategies failed: {last_error}"
+    return False, 0, None, f"All infobooks strategies failed: {last_error}"
 
 
 def try_wayback_download(url, dest_path):
-    """Try downloading from Wayback Machine for dead domains."""
-    dead_domains = ['ready4itall.org', 'kazvswild.com', 'landsurvival.com', 'survivorlibrary.com']
+    """Try downloading from Wayback Machine for dead domains.
+    Returns (success, size, sha256_hex, error_msg)."""
     domain = urllib.parse.urlparse(url).netloc.replace('www.', '')
 
-    if domain not in dead_domains:
-        return False, 0, "Not a dead domain"
+    if domain not in WAYBACK_DOMAINS:
+        return False, 0, None, "Not a dead domain"
 
     try:
         wb_url = f"https://web.archive.org/web/2024/{url}"
         req = urllib.request.Request(wb_url, headers={"User-Agent": USER_AGENT})
-        with urllib.request.urlopen(req, context=SSL_CTX, timeout=90) as response:
-            data = response.read()
-            if data[:4] == b'%PDF':
-                with open(dest_path, 'wb') as f:
-                    f.write(data)
-                return True, len(data), None
+        with OPENER.open(req, timeout=90) as response:
+            head = response.read(5)
+            if head.startswith(b'%PDF'):
+                size, file_hash = save_stream(response, dest_path, head)
+                return True, size, file_hash, None
             else:
-                return False, 0, "Wayback returned non-PDF content"
+                return False, 0, None, "Wayback returned non-PDF content"
+    except Exception as e:
+        return False, 0, None, f"Wayback failed: {e}"
+
+
+def retry_download(url, source, dest_path):
+    """Retry one failed download with the strategy that suits its source.
+    Returns (success, size, sha256_hex, error_msg)."""
+    if source == "scp-gdocs":
+        return try_gdocs_download(url, dest_path)
+    elif source == "infobooks":
+        return try_infobooks_download(url, dest_path)
+    elif any(domain in url for domain in WAYBACK_DOMAINS):
+        return try_wayback_download(url, dest_path)
+
+    # Generic retry with better headers
+    try:
+        req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT, "Accept": "*/*"})
+        with OPENER.open(req, timeout=60) as response:
+            head = response.read(5)
+            if head.startswith(b'%PDF'):
+                file_size, file_hash = save_stream(response, dest_path, head)
+                return True, file_size, file_hash, None
+            return False, 0, None, "Not a PDF"
     except Exception as e:
-        return False, 0, f"Wayback failed: {e}"
+        return False, 0, None, str(e)
+
+
+def retry_host(url):
+    """The host a retry of url actually talks to, for per-host throttling."""
+    if any(domain in url for domain in WAYBACK_DOMAINS):
+        return "web.archive.org"
+    return urllib.parse.urlparse(url).netloc
 
 
 def main():
     with open(MANIFEST_FILE) as f:
         manifest = json.load(f)
 
+    # Source names repeat across every item and failure; keep one copy of each
+    for entry in manifest["items"] + manifest["failures"]:
+        entry["source"] = sys.intern(entry["source"])
+
     failures = manifest["failures"]
     print(f"Retrying {len(failures)} failed downloads...")
 
@@ -192,69 +283,88 @@ def main():
         "remaining_failures": []
     }
 
-    for i, fail in enumerate(failures, 1):
-        url = fail["url"]
-        title = fail["title"]
-        source = fail["source"]
-        filename = sanitize_filename(title) + ".pdf"
-        dest_path = DOWNLOAD_DIR / filename
-
-        print(f"[{i}/{len(failures)}] Retrying: {title}...")
-
-        success = False
-        file_size = 0
-        error = ""
-
-        if source == "scp-gdocs":
-            success, file_size, error = try_gdocs_download(url, dest_path)
-        elif source == "infobooks":
-            success, file_size, error = try_infobooks_download(url, dest_path)
-        elif "ready4itall.org" in url or "kazvswild.com" in url or "landsurvival.com" in url or "survivorlibrary.com" in url:
-            success, file_size, error = try_wayback_download(url, dest_path)
-        else:
-            # Generic retry with better headers
+    # Retries run concurrently; results are recorded below in failure order.
+    # Each host's failures are dealt into at most MAX_PER_HOST lanes, and a lane
+    # runs its retries one after another, so no pool thread sits waiting for a
+    # busy host while other hosts have work.
+    last_start = {}
+    throttle_lock = threading.Lock()
+
+    def run_retry(fail, host, part_path):
+        # Space out request starts per host instead of pausing after every item
+        with throttle_lock:
+            now = time.monotonic()
+            start = max(now, last_start.get(host, 0.0) + HOST_DELAY)
+            last_start[host] = start
+        time.sleep(start - now)
+        return retry_download(fail["url"], fail["source"], part_path)
+
+    def run_lane(host, jobs):
+        for index, part_path in jobs:
             try:
-                req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT, "Accept": "*/*"})
-                with urllib.request.urlopen(req, context=SSL_CTX, timeout=60) as response:
-                    data = response.read()
-                    if data[:4] == b'%PDF':
-                        with open(dest_path, 'wb') as f:
-                            f.write(data)
-                        success = True
-                        file_size = len(data)
-                    else:
-                        error = "Not a PDF"
+                results[index].set_result(run_retry(failures[index], host, part_path))
             except Exception as e:
-                error = str(e)
-
-        if success:
-            file_hash = sha256_file(dest_path)
-            if file_hash in seen_hashes:
-                print(f"  -> DUP of {seen_hashes[file_hash]}")
-                os.remove(dest_path)
+                results[index].set_exception(e)
+
+    results = [Future() for _ in failures]
+    part_paths = []
+    jobs_by_host = defaultdict(list)
+    for index, fail in enumerate(failures):
+        # Each retry writes its own file beside the destination; main() moves it
+        # into place. The index keeps failures that share a title apart.
+        filename = sanitize_filename(fail["title"]) + ".pdf"
+        part_path = DOWNLOAD_DIR / f"{filename}.{index}.part"
+        part_paths.append(part_path)
+        jobs_by_host[retry_host(fail["url"])].append((index, part_path))
+
+    lanes = []
+    for lane in range(MAX_PER_HOST):
+        for host, jobs in jobs_by_host.items():
+            if jobs[lane::MAX_PER_HOST]:
+                lanes.append((host, jobs[lane::MAX_PER_HOST]))
+
+    with ThreadPoolExecutor(max_workers=RETRY_WORKERS) as executor:
+        for host, jobs in lanes:
+            executor.submit(run_lane, host, jobs)
+
+        for i, (fail, result, part_path) in enumerate(zip(failures, results, part_paths), 1):
+            url = fail["url"]
+            title = fail["title"]
+            source = fail["source"]
+            filename = sanitize_filename(title) + ".pdf"
+            dest_path = DOWNLOAD_DIR / filename
+
+            print(f"[{i}/{len(failures)}] Retrying: {title}...")
+
+            success, file_size, file_hash, error = result.result()
+
+            if success:
+                if file_hash in seen_hashes:
+                    print(f"  -> DUP of {seen_hashes[file_hash]}")
+                    os.remove(part_path)
+                else:
+                    os.replace(part_path, dest_path)
+                    seen_hashes[file_hash] = filename
+                    retry_results["newly_successful"] += 1
+                    retry_results["new_items"].append({
+                        "filename": filename,
+                        "title": title,
+                        "source": source,
+                        "original_url": url,
+                        "sha256": file_hash,
+                        "size_bytes": file_size
+                    })
+                    print(f"  -> OK ({file_size:,} bytes)")
             else:
-                seen_hashes[file_hash] = filename
-                retry_results["newly_successful"] += 1
-                retry_results["new_items"].append({
-                    "filename": filename,
+                part_path.unlink(missing_ok=True)
+                retry_results["still_failed"] += 1
+                retry_results["remaining_failures"].append({
                     "title": title,
+                    "url": url,
                     "source": source,
-                    "original_url": url,
-                    "sha256": file_hash,
-                    "size_bytes": file_size
+                    "error": error
                 })
-                print(f"  -> OK ({file_size:,} bytes)")
-        else:
-            retry_results["still_failed"] += 1
-            retry_results["remaining_failures"].append({
-                "title": title,
-                "url": url,
-                "source": source,
-                "error": error
-            })
-            print(f"  -> FAIL: {error[:80]}")
-
-        time.sleep(1)
+                print(f"  -> FAIL: {error[:80]}")
 
     print(f"\n{'='*60}")
     print(f"RETRY COMPLETE")
@@ -263,8 +373,7 @@ def main():
     print(f"{'='*60}")
 
     # Save retry manifest
-    with open(RETRY_MANIFEST, 'w', encoding='utf-8') as f:
-        json.dump(retry_results, f, indent=2, ensure_ascii=False)
+    write_json(RETRY_MANIFEST, retry_results)
 
     # Update main manifest with new items
     manifest["items"].extend(retry_results["new_items"])
@@ -277,8 +386,7 @@ def main():
     manifest["total_size_bytes"] = total_size
     manifest["total_size_mb"] = round(total_size / (1024 * 1024), 2)
 
-    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
-        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    write_json(MANIFEST_FILE, manifest)
 
     print(f"\nUpdated manifest: {manifest['successful']} successful, {manifest['failed']} failed")
     print(f"Total library size: {manifest['total_size_mb']} MB")